@@ -1,5 +1,4 @@
 """Bucket commands"""
-from asyncio import new_event_loop as loop
 from typing import List, Optional
 
 import click
@@ -10,12 +9,10 @@ from rich.table import Table
 
 from reduct_cli.utils.consoles import console
 from reduct_cli.utils.error import error_handle
-from reduct_cli.utils.helpers import parse_path, build_client, filter_entries
+from reduct_cli.utils.helpers import parse_path, build_client, filter_entries, run
 from reduct_cli.utils.humanize import pretty_size, print_datetime, parse_ci_size
 from reduct_cli.utils.humanize import pretty_time_interval
 
-run = loop().run_until_complete
-
 
 async def _get_bucket_by_path(ctx, path):
     alias_name, bucket_name = parse_path(path)
@@ -1,5 +1,4 @@
 """Export Command"""
-from asyncio import new_event_loop as loop
 from typing import Optional
 
 import click
@@ -10,10 +9,9 @@ from reduct_cli.utils.error import error_handle
 from reduct_cli.utils.helpers import (
     parse_path,
     build_client,
+    run,
 )
 
-run = loop().run_until_complete
-
 start_option = click.option(
     "--start",
     help="Export records with timestamps newer than this time point in ISO format"
@@ -77,6 +75,20 @@ def export():
     help="Export metadata along with the data",
     default=False,
 )
+@click.option(
+    "--format",
+    "export_format",
+    type=click.Choice(["dir", "tar"]),
+    help="Export each entry to a folder with a file per record "
+    "or to a tar archive with a file per record",
+    default="dir",
+)
+@click.option(
+    "--skip-existing/--no-skip-existing",
+    help="Skip records which have already been exported with the same size, "
+    "only for the dir format",
+    default=False,
+)
 @click.pass_context
 def folder(
     ctx,
@@ -89,8 +101,10 @@ def folder(
     exclude: str,
     ext: Optional[str],
     with_metadata: bool,
+    export_format: str,
+    skip_existing: bool,
     limit: Optional[int],
-):  # pylint: disable=too-many-arguments
+):  # pylint: disable=too-many-arguments, too-many-locals
     """Export data from SRC bucket to DST folder
 
     SRC should be in the format of ALIAS/BUCKET_NAME.
@@ -99,13 +113,20 @@ def folder(
     As result, the folder will contain a folder for each entry in the bucket.
     Each entry folder will contain a file for each record
     in the entry with the timestamp as the name.
+    With --format tar, the folder will contain a tar archive
+    for each entry instead.
     """
 
-    alias_name, src_bucket = parse_path(src)
-    client = build_client(
-        ctx.obj["config_path"], alias_name, timeout=ctx.obj["timeout"]
-    )
+    if skip_existing and export_format == "tar":
+        raise click.BadOptionUsage(
+            "skip_existing", "--skip-existing can't be used with --format tar"
+        )
+
     with error_handle():
+        alias_name, src_bucket = parse_path(src)
+        client = build_client(
+            ctx.obj["config_path"], alias_name, timeout=ctx.obj["timeout"]
+        )
         run(
             export_to_folder(
                 client,
@@ -120,6 +141,8 @@ def folder(
                 ext=ext,
                 timeout=ctx.obj["timeout"],
                 with_metadata=with_metadata,
+                export_format=export_format,
+                skip_existing=skip_existing,
                 limit=limit,
             )
         )
@@ -7,6 +7,7 @@ from rich.progress import Progress
 from reduct_cli.utils.helpers import (
     read_records_with_progress,
     filter_entries,
+    gather_or_cancel,
 )
 
 
@@ -67,4 +68,4 @@ async def export_to_bucket(
                     await src_bucket.get_entry_list(), kwargs["entries"]
                 )
             ]
-            await asyncio.gather(*tasks)
+            await gather_or_cancel(*tasks)
@@ -1,53 +1,355 @@
 """Module for export folder command"""
 import asyncio
 import json
+import os
+import tarfile
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
 from mimetypes import guess_extension
 from pathlib import Path
+from typing import BinaryIO, Callable, Dict, List, Tuple
 
 from reduct import Client as ReductClient
-from reduct import EntryInfo, Bucket
+from reduct import EntryInfo, Bucket, Record
 from rich.progress import Progress
 
-from reduct_cli.utils.helpers import filter_entries, read_records_with_progress
+from reduct_cli.utils.helpers import (
+    filter_entries,
+    gather_or_cancel,
+    read_records_with_progress,
+)
 
+CHUNK_SIZE = 1024 * 1024
+SINGLE_READ_SIZE = 8 * CHUNK_SIZE
+PREFETCH_CHUNKS = 2
+BATCH_FILES = 64
+BATCH_SIZE = 8 * CHUNK_SIZE
 
-async def _export_entry(
-    path: Path, entry: EntryInfo, bucket: Bucket, progress: Progress, sem, **kwargs
+
+async def _in_thread(executor: Executor, func: Callable, *args):
+    """Run blocking function in a worker thread of the export
+
+    If the caller is cancelled, it still waits for the function to finish,
+    so that the thread doesn't use files or archives after they are closed.
+    """
+    future = asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    try:
+        return await asyncio.shield(future)
+    finally:
+        await _wait_thread(future)
+
+
+async def _wait_thread(future: asyncio.Future) -> None:
+    """Wait for worker thread, its error is dropped if the caller is cancelled"""
+    await asyncio.wait([future])
+    if not future.cancelled():
+        future.exception()
+
+
+class _FileBatch:
+    """Small files to be written together in one worker thread call"""
+
+    def __init__(
+        self, write: Callable[[List[Tuple[str, bytes]]], None], executor: Executor
+    ):
+        self.write = write
+        self.executor = executor
+        self.files: List[Tuple[str, bytes]] = []
+        self.size = 0
+
+    def add(self, name: str, data: bytes):
+        """Add file to batch"""
+        self.files.append((name, data))
+        self.size += len(data)
+
+    def full(self) -> bool:
+        """Check if the batch should be flushed"""
+        return len(self.files) >= BATCH_FILES or self.size >= BATCH_SIZE
+
+    async def flush(self):
+        """Write all files of the batch"""
+        if self.files:
+            files, self.files, self.size = self.files, [], 0
+            await _in_thread(self.executor, self.write, files)
+
+
+def _write_files(prefix: str, files: List[Tuple[str, bytes]]) -> None:
+    for name, data in files:
+        with open(prefix + name, "wb") as file:
+            file.write(data)
+
+
+def _add_files(tar: tarfile.TarFile, files: List[Tuple[str, bytes]]) -> None:
+    mtime = int(time.time())
+    for name, data in files:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = mtime
+        tar.addfile(info, BytesIO(data))
+
+
+def _write_chunks(file: BinaryIO, chunks: List[bytes]) -> None:
+    if not hasattr(os, "writev"):
+        file.writelines(chunks)
+        return
+
+    # one system call for all chunks without joining them
+    iov = [memoryview(chunk) for chunk in chunks]
+    while iov:
+        written = os.writev(file.fileno(), iov)
+        while iov and written >= len(iov[0]):
+            written -= len(iov.pop(0))
+        if written:
+            iov[0] = iov[0][written:]
+
+
+async def _fetch_chunks(record: Record, queue: asyncio.Queue) -> None:
+    """Put chunks of record into queue, followed by None or the read error"""
+    try:
+        async for chunk in record.read(CHUNK_SIZE):
+            await queue.put(chunk)
+    except Exception as err:  # pylint: disable=broad-except
+        await queue.put(err)
+        return
+    await queue.put(None)
+
+
+class _RecordReader:  # pylint: disable=too-few-public-methods
+    """Blocking file-like reader of chunks fetched in the event loop
+
+    It is used by a worker thread, so that sync code like tarfile can copy
+    records without keeping them in memory.
+    """
+
+    def __init__(self, queue: asyncio.Queue, loop: asyncio.AbstractEventLoop):
+        self._queue = queue
+        self._loop = loop
+        self._rest = memoryview(b"")
+        self._eof = False
+
+    def read(self, size: int = -1) -> bytes:
+        """Read up to size bytes, all the rest if size is negative"""
+        pieces = []
+        while size != 0 and not self._eof:
+            if not self._rest:
+                chunk = asyncio.run_coroutine_threadsafe(
+                    self._queue.get(), self._loop
+                ).result()
+                if isinstance(chunk, Exception):
+                    raise chunk
+                if chunk is None:
+                    self._eof = True
+                    break
+                self._rest = memoryview(chunk)
+
+            piece = self._rest if size < 0 else self._rest[:size]
+            self._rest = self._rest[len(piece) :]
+            pieces.append(piece)
+            if size > 0:
+                size -= len(piece)
+        return b"".join(pieces)
+
+
+async def _add_record(
+    record: Record, tar: tarfile.TarFile, name: str, executor: Executor
 ) -> None:
-    entry_path = Path(path / entry.name)
-    entry_path.mkdir(exist_ok=True)
+    """Add record to archive, the next chunks are fetched while the current are added"""
+    queue = asyncio.Queue(maxsize=PREFETCH_CHUNKS)
+    fetching = asyncio.create_task(_fetch_chunks(record, queue))
+
+    info = tarfile.TarInfo(name)
+    info.size = record.size
+    info.mtime = int(time.time())
+    loop = asyncio.get_running_loop()
+    adding = loop.run_in_executor(
+        executor, tar.addfile, info, _RecordReader(queue, loop)
+    )
+    try:
+        await asyncio.shield(adding)
+    finally:
+        fetching.cancel()
+        # unblock the reader if it still waits for chunks
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RuntimeError(f"Adding record {name} aborted"))
+        # the archive may be closed only after the thread is done with it
+        await _wait_thread(adding)
+
 
+async def _open_file(file_path: str, executor: Executor) -> BinaryIO:
+    """Open file for writing in a worker thread
+
+    If the caller is cancelled meanwhile, the opened file is closed in the thread too.
+    """
+    opening = asyncio.get_running_loop().run_in_executor(
+        executor, open, file_path, "wb"
+    )
+    try:
+        return await asyncio.shield(opening)
+    except asyncio.CancelledError:
+        await _wait_thread(opening)
+        if not opening.cancelled() and opening.exception() is None:
+            await _in_thread(executor, opening.result().close)
+        raise
+
+
+async def _stream_record(record: Record, file_path: str, executor: Executor) -> None:
+    """Write record to file, the next chunks are fetched while the current are written"""
+    queue = asyncio.Queue(maxsize=PREFETCH_CHUNKS)
+    fetching = asyncio.create_task(_fetch_chunks(record, queue))
+    file = None
+    try:
+        file = await _open_file(file_path, executor)
+        last = False
+        while not last:
+            # take all the fetched chunks to write them at once
+            chunks = [await queue.get()]
+            while not queue.empty():
+                chunks.append(queue.get_nowait())
+
+            if isinstance(chunks[-1], Exception):
+                raise chunks[-1]
+            if chunks[-1] is None:
+                last = True
+                chunks.pop()
+            if chunks:
+                await _in_thread(executor, _write_chunks, file, chunks)
+    finally:
+        fetching.cancel()
+        if file is not None:
+            # closing flushes the file, it may block on network filesystems
+            await _in_thread(executor, file.close)
+
+
+class _ExtensionCache(dict):
+    """File extensions guessed from content types, each type is guessed once"""
+
+    def __missing__(self, content_type: str) -> str:
+        guess = guess_extension(content_type)
+        ext = self[content_type] = guess if guess is not None else ".bin"
+        return ext
+
+
+def _dump_metadata(record: Record) -> bytes:
+    return json.dumps(
+        {
+            "timestamp": record.timestamp,
+            "content_type": record.content_type,
+            "size": record.size,
+            "labels": record.labels,
+        },
+        indent=4,
+    ).encode("utf-8")
+
+
+def _entry_target(path: Path, entry: EntryInfo, export_format: str) -> str:
+    """Path to the entry's archive or prefix for file names of its records"""
+    if export_format == "tar":
+        return str(path / f"{entry.name}.tar")
+    return str(path / entry.name) + os.sep
+
+
+def _file_sizes(path: str) -> Dict[str, int]:
+    with os.scandir(path) as files:
+        return {file.name: file.stat().st_size for file in files if file.is_file()}
+
+
+def _make_dirs(paths: List[str]) -> None:
+    for path in paths:
+        os.makedirs(path, exist_ok=True)
+
+
+async def _open_archive(
+    target: str, executor: Executor, archives: asyncio.Semaphore
+) -> tarfile.TarFile:
+    """Open archive when a slot is free, the slot is released after closing it"""
+    await archives.acquire()
+    try:
+        return await _in_thread(
+            executor, partial(tarfile.open, target, "w", copybufsize=CHUNK_SIZE)
+        )
+    except BaseException:
+        archives.release()
+        raise
+
+
+async def _drain_entry(  # pylint: disable=too-many-arguments, too-many-locals, too-many-branches
+    target: str,
+    entry: EntryInfo,
+    bucket: Bucket,
+    progress: Progress,
+    sem,
+    executor: Executor,
+    archives: asyncio.Semaphore,
+    **kwargs,
+) -> None:
     force_ext = None
     if kwargs["ext"] is not None:
         force_ext = "." + kwargs["ext"].split(".")[-1]
 
+    exts = _ExtensionCache()
+
+    export_tar = kwargs["export_format"] == "tar"
+    tar = None
+    batch = None
+    existing = {}
     with_meta = kwargs["with_metadata"]
-    async for record in read_records_with_progress(
-        entry, bucket, progress, sem, **kwargs
-    ):
-        if force_ext is None:
-            # guess extension from content type
-            guess = guess_extension(record.content_type)
-            ext = guess if guess is not None else ".bin"
-        else:
-            ext = force_ext
-        with open(entry_path / f"{record.timestamp}{ext}", "wb") as file:
-            async for chunk in record.read(1024 * 512):
-                file.write(chunk)
-        if with_meta:
-            with open(
-                entry_path / f"{record.timestamp}.json", "w", encoding="utf-8"
-            ) as file:
-                json.dump(
-                    {
-                        "timestamp": record.timestamp,
-                        "content_type": record.content_type,
-                        "size": record.size,
-                        "labels": record.labels,
-                    },
-                    file,
-                    indent=4,
-                )
+    try:
+        async for record in read_records_with_progress(
+            entry, bucket, progress, sem, **kwargs
+        ):
+            if batch is None:
+                # open the archive or list exported files only when the entry
+                # is being read, so it is done for at most --parallel entries
+                if export_tar:
+                    tar = await _open_archive(target, executor, archives)
+                    batch = _FileBatch(partial(_add_files, tar), executor)
+                else:
+                    batch = _FileBatch(partial(_write_files, target), executor)
+                    if kwargs["skip_existing"]:
+                        existing = await _in_thread(executor, _file_sizes, target)
+
+            timestamp = record.timestamp
+            name = f"{timestamp}{force_ext or exts[record.content_type]}"
+            if existing.get(name) == record.size and (
+                not with_meta or f"{timestamp}.json" in existing
+            ):
+                # already exported
+                continue
+
+            if record.size > SINGLE_READ_SIZE:
+                if tar is None:
+                    await _stream_record(record, target + name, executor)
+                else:
+                    # keep members in order of records
+                    await batch.flush()
+                    await _add_record(record, tar, name, executor)
+            else:
+                # small records are read at once and written in batches
+                batch.add(name, await record.read_all())
+
+            if with_meta:
+                batch.add(f"{timestamp}.json", _dump_metadata(record))
+
+            if batch.full():
+                await batch.flush()
+
+        if batch is None and export_tar:
+            # entry without records still gets an empty archive
+            tar = await _open_archive(target, executor, archives)
+    finally:
+        try:
+            if batch is not None:
+                # write records which have been read also if the entry fails
+                await batch.flush()
+        finally:
+            if tar is not None:
+                try:
+                    await _in_thread(executor, tar.close)
+                finally:
+                    archives.release()
 
 
 async def export_to_folder(
@@ -60,14 +362,33 @@ async def export_to_folder(
     async with client as client:
         bucket: Bucket = await client.get_bucket(bucket_name)
         folder_path = Path(dest)
-        folder_path.mkdir(parents=True, exist_ok=True)
         sem = asyncio.Semaphore(kwargs["parallel"])
+        archives = asyncio.Semaphore(kwargs["parallel"])
+
+        entries = filter_entries(await bucket.get_entry_list(), kwargs["entries"])
+        targets = [
+            _entry_target(folder_path, entry, kwargs["export_format"])
+            for entry in entries
+        ]
+
+        # each entry writes in one worker thread at a time
+        with ThreadPoolExecutor(max_workers=kwargs["parallel"]) as executor:
+            # create all folders in one go before any record is requested
+            folders = [dest] if kwargs["export_format"] == "tar" else [dest, *targets]
+            await _in_thread(executor, _make_dirs, folders)
 
-        with Progress() as progress:
-            tasks = [
-                _export_entry(folder_path, entry, bucket, progress, sem, **kwargs)
-                for entry in filter_entries(
-                    await bucket.get_entry_list(), kwargs["entries"]
-                )
-            ]
-            await asyncio.gather(*tasks)
+            with Progress() as progress:
+                tasks = [
+                    _drain_entry(
+                        target,
+                        entry,
+                        bucket,
+                        progress,
+                        sem,
+                        executor,
+                        archives,
+                        **kwargs,
+                    )
+                    for target, entry in zip(targets, entries)
+                ]
+                await gather_or_cancel(*tasks)
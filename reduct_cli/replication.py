@@ -1,5 +1,4 @@
 """Replication commands"""
-from asyncio import new_event_loop as loop
 from typing import List
 
 import click
@@ -12,9 +11,7 @@ from rich.table import Table
 from reduct_cli.export import entries_option, include_option, exclude_option
 from reduct_cli.utils.consoles import console
 from reduct_cli.utils.error import error_handle
-from reduct_cli.utils.helpers import build_client, extract_key_values
-
-run = loop().run_until_complete
+from reduct_cli.utils.helpers import build_client, extract_key_values, run
 
 
 @click.group()
@@ -1,16 +1,12 @@
 """Server commands"""
-from asyncio import new_event_loop as loop
-
 import click
 from reduct import ServerInfo
 
 from reduct_cli.utils.consoles import console
 from reduct_cli.utils.error import error_handle
-from reduct_cli.utils.helpers import build_client
+from reduct_cli.utils.helpers import build_client, run
 from reduct_cli.utils.humanize import pretty_time_interval
 
-run = loop().run_until_complete
-
 
 @click.group()
 def server():
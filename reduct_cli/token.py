@@ -1,5 +1,4 @@
 """Token command"""
-from asyncio import new_event_loop as loop
 from typing import List
 
 import click
@@ -8,9 +7,7 @@ from reduct import Token, FullTokenInfo
 
 from reduct_cli.utils.consoles import console
 from reduct_cli.utils.error import error_handle
-from reduct_cli.utils.helpers import build_client
-
-run = loop().run_until_complete
+from reduct_cli.utils.helpers import build_client, run
 
 
 @click.group()
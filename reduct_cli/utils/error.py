@@ -11,6 +11,9 @@ def error_handle():
     """Wrap try-catch block and print error"""
     try:
         yield
+    except Abort:
+        # already reported
+        raise
     except Exception as err:
         error_console.print(f"[{type(err).__name__}] {err}")
         raise Abort() from err
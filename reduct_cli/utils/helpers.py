@@ -1,11 +1,11 @@
 """Helper functions"""
 import asyncio
 import signal
-import time
 from asyncio import Semaphore, Queue
 from datetime import datetime
 from pathlib import Path
-from typing import Tuple, List, Dict
+from time import monotonic, time
+from typing import Tuple, List, Dict, Awaitable, Coroutine
 
 from click import Abort
 from reduct import EntryInfo, Bucket, Client
@@ -17,6 +17,18 @@ from reduct_cli.utils.humanize import pretty_size
 
 signal_queue = Queue()
 
+PROGRESS_INTERVAL = 1 / 30
+
+
+def run(coro: Coroutine):
+    """Run coroutine in a new event loop, uvloop is used if it is installed"""
+    try:
+        # imported only by commands which run a loop
+        import uvloop  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return asyncio.run(coro)
+    return uvloop.run(coro)
+
 
 def get_alias(config_path: Path, name: str) -> Alias:
     """Helper method to parse alias from config"""
@@ -110,12 +122,28 @@ async def read_records_with_progress(
         asyncio.get_event_loop().add_signal_handler(signal.SIGINT, stop_signal)
         asyncio.get_event_loop().add_signal_handler(signal.SIGTERM, stop_signal)
 
+        def show_progress(timestamp: int, copied: int):
+            nonlocal last_time
+            progress.update(
+                task,
+                description=f"Entry '{entry.name}' "
+                f"(copied {copied} records ({pretty_size(exported_size)}), "
+                f"speed {pretty_size(speed) if speed else '? B'}/s)",
+                advance=timestamp - last_time,
+                refresh=True,
+            )
+            last_time = timestamp
+
+        next_update = 0
+        pending = None
         async for record in bucket.query(
             entry.name,
             **params,
         ):
             if signal_queue.qsize() > 0:
                 # stop signal received
+                if pending is not None:
+                    show_progress(*pending)
                 progress.update(
                     task,
                     description=f"Entry '{entry.name}' "
@@ -125,27 +153,38 @@ async def read_records_with_progress(
                 return
 
             exported_size += record.size
-            stats.append((record.size, time.time()))
+            stats.append((record.size, time()))
             if len(stats) > 100:
                 speed = sum(s[0] for s in stats) / (stats[-1][1] - stats[0][1])
                 stats = stats[-50:]
 
             yield record
 
-            progress.update(
-                task,
-                description=f"Entry '{entry.name}' "
-                f"(copied {count} records ({pretty_size(exported_size)}), "
-                f"speed {pretty_size(speed) if speed else '? B'}/s)",
-                advance=record.timestamp - last_time,
-                refresh=True,
-            )
-            last_time = record.timestamp
+            # re-render progress bar not more often than PROGRESS_INTERVAL
+            pending = (record.timestamp, count)
+            if monotonic() >= next_update:
+                show_progress(*pending)
+                pending = None
+                next_update = monotonic() + PROGRESS_INTERVAL
             count += 1
 
+        if pending is not None:
+            show_progress(*pending)
         progress.update(task, total=1, completed=True)
 
 
+async def gather_or_cancel(*aws: Awaitable):
+    """Run awaitables concurrently and cancel the rest if one of them fails"""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
 def filter_entries(entries: List[EntryInfo], names: List[str]) -> List[EntryInfo]:
     """Filter entries by names"""
     if not names or len(names) == 0:
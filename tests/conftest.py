@@ -2,7 +2,7 @@
 from functools import partial
 from pathlib import Path
 from tempfile import gettempdir
-from typing import Callable, Optional, List, Any
+from typing import Callable, Optional, List, Any, Union
 
 import pytest
 from click.testing import CliRunner, Result
@@ -22,6 +22,41 @@ class AsyncIter:  # pylint: disable=too-few-public-methods
             yield item
 
 
+def make_record(
+    timestamp: int,
+    chunks: List[Union[bytes, Exception]],
+    content_type: str = "",
+    size: Optional[int] = None,
+) -> Record:
+    """Make record which is read by chunks
+
+    An exception in chunks is raised when it is reached.
+    Size is the length of the chunks if not specified.
+    """
+
+    async def read_all():
+        return b"".join([chunk async for chunk in read(0)])
+
+    async def read(_n: int):
+        for chunk in chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    if size is None:
+        size = sum(len(chunk) for chunk in chunks if isinstance(chunk, bytes))
+
+    return Record(
+        timestamp=timestamp,
+        size=size,
+        content_type=content_type,
+        labels={},
+        last=True,
+        read_all=read_all,
+        read=read,
+    )
+
+
 @pytest.fixture(name="runner")
 def _make_runner() -> Callable[[str], Result]:
     runner = CliRunner()
@@ -52,26 +87,9 @@ def _make_settings() -> BucketSettings:
 
 @pytest.fixture(name="records")
 def _make_records() -> List[Record]:
-    def make_record(timestamp: int, data: bytes, content_type: str) -> Record:
-        async def read_all():
-            return data
-
-        async def read(_n: int):
-            yield data
-
-        return Record(
-            timestamp=timestamp,
-            size=len(data),
-            content_type=content_type,
-            labels={},
-            last=True,
-            read_all=read_all,
-            read=read,
-        )
-
     return [
-        make_record(1000000000, b"Hey", "image/png"),
-        make_record(5000000000, b"Bye", ""),
+        make_record(1000000000, [b"Hey"], "image/png"),
+        make_record(5000000000, [b"Bye"]),
     ]
 
 
@@ -28,18 +28,25 @@ def _make_client(mocker, src_bucket, dest_bucket) -> Client:
     return client
 
 
-def walk_async_iterator(iterator: AsyncIter):
+@pytest.fixture(name="loop", scope="module")
+def _make_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def walk_async_iterator(loop: asyncio.AbstractEventLoop, iterator: AsyncIter):
     """Walk through async iterator and return a list"""
 
     async def walk():
         return [data async for data in iterator]
 
-    return asyncio.new_event_loop().run_until_complete(walk())
+    return loop.run_until_complete(walk())
 
 
 @pytest.mark.usefixtures("set_alias")
 def test__export_bucket_ok(
-    runner, conf, client, src_settings, src_bucket, dest_bucket, records
+    runner, conf, client, src_settings, src_bucket, dest_bucket, records, loop
 ):  # pylint: disable=too-many-arguments
     """Should export data from a bucket to another one
     and create destination bucket if it doesn't exist"""
@@ -63,9 +70,9 @@ def test__export_bucket_ok(
         content_type=records[0].content_type,
         labels=records[0].labels,
     )
-    assert walk_async_iterator(dest_bucket.write.await_args_list[0].kwargs["data"]) == [
-        b"Hey"
-    ]
+    assert walk_async_iterator(
+        loop, dest_bucket.write.await_args_list[0].kwargs["data"]
+    ) == [b"Hey"]
     assert dest_bucket.write.await_args_list[1] == call(
         "entry-1",
         data=ANY,
@@ -74,9 +81,9 @@ def test__export_bucket_ok(
         content_type=records[1].content_type,
         labels=records[1].labels,
     )
-    assert walk_async_iterator(dest_bucket.write.await_args_list[1].kwargs["data"]) == [
-        b"Bye"
-    ]
+    assert walk_async_iterator(
+        loop, dest_bucket.write.await_args_list[1].kwargs["data"]
+    ) == [b"Bye"]
 
     assert src_bucket.query.call_args_list[1] == call(
         "entry-2", start=1000000000, stop=5000000000, include={}, exclude={}, ttl=ANY
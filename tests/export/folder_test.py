@@ -1,12 +1,18 @@
 """Unit tests for export folder command"""
+import asyncio
+import dataclasses
 import json
 import shutil
+import tarfile
 from pathlib import Path
 from tempfile import gettempdir
 from unittest.mock import call, ANY
 
 import pytest
-from reduct import Client
+from reduct import Client, EntryInfo
+
+from reduct_cli.export_impl.folder import CHUNK_SIZE, SINGLE_READ_SIZE, BATCH_FILES
+from tests.conftest import AsyncIter, make_record
 
 
 @pytest.fixture(name="client")
@@ -81,6 +87,25 @@ def test__export_to_folder_ok_without_interval(runner, conf, src_bucket, export_
     )
 
 
+@pytest.mark.usefixtures("set_alias")
+def test__export_to_folder_wrong_path(runner, conf, export_path):
+    """Should print error if SRC has wrong format"""
+    result = runner(f"-c {conf} export folder src_bucket {export_path}")
+    assert result.output == (
+        "[RuntimeError] Path src_bucket has wrong format. "
+        "It must be 'ALIAS/BUCKET_NAME'\nAborted!\n"
+    )
+    assert result.exit_code == 1
+
+
+@pytest.mark.usefixtures("set_alias")
+def test__export_to_folder_unknown_alias(runner, conf, export_path):
+    """Should print error once if alias doesn't exist"""
+    result = runner(f"-c {conf} export folder other/src_bucket {export_path}")
+    assert result.output == "Alias 'other' doesn't exist\nAborted!\n"
+    assert result.exit_code == 1
+
+
 @pytest.mark.usefixtures("set_alias")
 def test__export_to_folder_fail(runner, client, conf, export_path):
     """Should fail if the destination folder does not exist"""
@@ -239,3 +264,278 @@ def test__export_to_folder_with_metadata(runner, conf, export_path, records):
         "size": records[0].size,
         "labels": records[0].labels,
     }
+
+
+@pytest.mark.usefixtures("set_alias", "client")
+def test__export_to_folder_large_record(runner, conf, src_bucket, export_path):
+    """Should export a large record chunk by chunk"""
+    chunks = [b"a" * SINGLE_READ_SIZE, b"b" * CHUNK_SIZE]
+    src_bucket.query.return_value = AsyncIter([make_record(1000000000, chunks)])
+
+    result = runner(
+        f"-c {conf} export folder test/src_bucket {export_path} --entries=entry-1"
+    )
+    assert result.exit_code == 0
+    assert (export_path / "entry-1" / "1000000000.bin").read_bytes() == b"".join(chunks)
+
+
+@pytest.mark.usefixtures("set_alias", "client")
+def test__export_to_folder_large_record_error(runner, conf, src_bucket, export_path):
+    """Should fail if a chunk of a large record can't be read"""
+    record = make_record(
+        1000000000,
+        [b"a" * CHUNK_SIZE, RuntimeError("Oops")],
+        size=SINGLE_READ_SIZE + CHUNK_SIZE,
+    )
+    src_bucket.query.return_value = AsyncIter([record])
+
+    result = runner(
+        f"-c {conf} export folder test/src_bucket {export_path} --entries=entry-1"
+    )
+    assert result.output.endswith("[RuntimeError] Oops\nAborted!\n")
+    assert result.exit_code == 1
+
+
+@pytest.mark.usefixtures("set_alias", "client")
+def test__export_to_folder_many_records(runner, conf, src_bucket, export_path):
+    """Should write all small records if there are more than one batch of them"""
+    count = BATCH_FILES * 2 + 1
+    src_bucket.query.return_value = AsyncIter(
+        [make_record(ts, [str(ts).encode()]) for ts in range(count)]
+    )
+
+    result = runner(
+        f"-c {conf} export folder test/src_bucket {export_path} --entries=entry-1"
+    )
+    assert result.exit_code == 0
+    for timestamp in range(count):
+        assert (export_path / "entry-1" / f"{timestamp}.bin").read_bytes() == str(
+            timestamp
+        ).encode()
+
+
+@pytest.mark.usefixtures("set_alias", "client", "src_bucket")
+def test__export_to_folder_tar(runner, conf, export_path, records):
+    """Should export each entry to a tar archive"""
+    result = runner(
+        f"-c {conf} export folder test/src_bucket {export_path} "
+        f"--format tar --with-metadata"
+    )
+    assert "Entry 'entry-1' (copied 1 records (6 B)" in result.output
+    assert result.exit_code == 0
+    assert not (export_path / "entry-1").exists()
+
+    with tarfile.open(export_path / "entry-1.tar") as tar:
+        assert tar.getnames() == [
+            f"{records[0].timestamp}.png",
+            f"{records[0].timestamp}.json",
+            f"{records[1].timestamp}.bin",
+            f"{records[1].timestamp}.json",
+        ]
+        assert tar.extractfile(f"{records[0].timestamp}.png").read() == b"Hey"
+        assert tar.extractfile(f"{records[1].timestamp}.bin").read() == b"Bye"
+        assert json.loads(tar.extractfile(f"{records[1].timestamp}.json").read()) == {
+            "timestamp": records[1].timestamp,
+            "content_type": records[1].content_type,
+            "size": records[1].size,
+            "labels": records[1].labels,
+        }
+
+
+@pytest.mark.usefixtures("set_alias", "client")
+def test__export_to_folder_tar_large_record(runner, conf, src_bucket, export_path):
+    """Should add a large record to a tar archive chunk by chunk"""
+    chunks = [b"a" * SINGLE_READ_SIZE, b"b" * 10, b"c" * CHUNK_SIZE]
+    src_bucket.query.return_value = AsyncIter([make_record(1000000000, chunks)])
+
+    result = runner(
+        f"-c {conf} export folder test/src_bucket {export_path} "
+        f"--entries=entry-1 --format tar"
+    )
+    assert result.exit_code == 0
+    with tarfile.open(export_path / "entry-1.tar") as tar:
+        assert tar.extractfile("1000000000.bin").read() == b"".join(chunks)
+
+
+@pytest.mark.usefixtures("set_alias", "client")
+def test__export_to_folder_tar_large_record_error(
+    runner, conf, src_bucket, export_path
+):
+    """Should fail if a chunk of a large record can't be read for a tar archive"""
+    record = make_record(
+        1000000000,
+        [b"a" * CHUNK_SIZE, RuntimeError("Oops")],
+        size=SINGLE_READ_SIZE + CHUNK_SIZE,
+    )
+    src_bucket.query.return_value = AsyncIter([record])
+
+    result = runner(
+        f"-c {conf} export folder test/src_bucket {export_path} "
+        f"--entries=entry-1 --format tar"
+    )
+    assert result.output.endswith("[RuntimeError] Oops\nAborted!\n")
+    assert result.exit_code == 1
+
+
+@pytest.mark.usefixtures("set_alias", "client", "src_bucket")
+def test__export_to_folder_skip_existing(runner, conf, export_path, records):
+    """Should skip records which have already been exported with the same size"""
+    (export_path / "entry-1").mkdir(parents=True)
+    (export_path / "entry-1" / f"{records[0].timestamp}.png").write_bytes(b"Old")
+    (export_path / "entry-1" / f"{records[1].timestamp}.bin").write_bytes(b"Older")
+
+    result = runner(
+        f"-c {conf} export folder test/src_bucket {export_path} "
+        f"--entries=entry-1 --skip-existing"
+    )
+    assert result.exit_code == 0
+    assert (
+        export_path / "entry-1" / f"{records[0].timestamp}.png"
+    ).read_bytes() == b"Old"
+    assert (
+        export_path / "entry-1" / f"{records[1].timestamp}.bin"
+    ).read_bytes() == b"Bye"
+
+
+@pytest.mark.usefixtures("set_alias", "client")
+def test__export_to_folder_tar_cancelled(mocker, runner, conf, src_bucket, export_path):
+    """Should close an archive only after a cancelled record is no longer added"""
+    events = []
+    addfile, close = tarfile.TarFile.addfile, tarfile.TarFile.close
+
+    def _addfile(tar, *args):
+        try:
+            return addfile(tar, *args)
+        finally:
+            events.append((Path(tar.name).name, "addfile"))
+
+    def _close(tar):
+        events.append((Path(tar.name).name, "close"))
+        return close(tar)
+
+    mocker.patch.object(tarfile.TarFile, "addfile", _addfile)
+    mocker.patch.object(tarfile.TarFile, "close", _close)
+
+    async def read(_n: int):
+        yield b"a" * CHUNK_SIZE
+        await asyncio.sleep(5)
+
+    async def fail():
+        await asyncio.sleep(0.1)
+        raise RuntimeError("Oops")
+        yield  # pylint: disable=unreachable
+
+    record = dataclasses.replace(
+        make_record(1000000000, [], size=SINGLE_READ_SIZE + CHUNK_SIZE), read=read
+    )
+    src_bucket.query.side_effect = lambda name, **_: (
+        AsyncIter([record]) if name == "entry-1" else fail()
+    )
+
+    result = runner(
+        f"-c {conf} export folder test/src_bucket {export_path} "
+        f"--entries=entry-1,entry-2 --format tar"
+    )
+    assert result.output.endswith("[RuntimeError] Oops\nAborted!\n")
+    assert result.exit_code == 1
+    assert [event for name, event in events if name == "entry-1.tar"] == [
+        "addfile",
+        "close",
+    ]
+
+
+@pytest.mark.usefixtures("set_alias", "client", "src_bucket")
+def test__export_to_folder_skip_existing_without_metadata(
+    runner, conf, export_path, records
+):
+    """Should export record again if its metadata is missing"""
+    (export_path / "entry-1").mkdir(parents=True)
+    (export_path / "entry-1" / f"{records[0].timestamp}.png").write_bytes(b"Old")
+
+    result = runner(
+        f"-c {conf} export folder test/src_bucket {export_path} "
+        f"--entries=entry-1 --skip-existing --with-metadata"
+    )
+    assert result.exit_code == 0
+    assert (
+        export_path / "entry-1" / f"{records[0].timestamp}.png"
+    ).read_bytes() == b"Hey"
+    assert (export_path / "entry-1" / f"{records[0].timestamp}.json").exists()
+
+
+@pytest.mark.usefixtures("set_alias", "client")
+def test__export_to_folder_skip_existing_tar(runner, conf, src_bucket, export_path):
+    """Should reject --skip-existing for tar archives"""
+    result = runner(
+        f"-c {conf} export folder test/src_bucket {export_path} "
+        f"--skip-existing --format tar"
+    )
+    assert "--skip-existing can't be used with --format tar" in result.output
+    assert result.exit_code == 2
+    src_bucket.query.assert_not_called()
+
+
+@pytest.mark.usefixtures("set_alias", "client")
+def test__export_to_folder_tar_open_archives(
+    mocker, runner, conf, src_bucket, export_path
+):
+    """Should keep not more archives open than parallel tasks"""
+    opened = set()
+    max_opened = 0
+    open_tar, close = tarfile.open, tarfile.TarFile.close
+
+    def _open(*args, **kwargs):
+        nonlocal max_opened
+        tar = open_tar(*args, **kwargs)
+        opened.add(tar)
+        max_opened = max(max_opened, len(opened))
+        return tar
+
+    def _close(tar):
+        opened.discard(tar)
+        return close(tar)
+
+    mocker.patch.object(tarfile, "open", _open)
+    mocker.patch.object(tarfile.TarFile, "close", _close)
+
+    src_bucket.get_entry_list.return_value = [
+        EntryInfo(
+            name=f"entry-{i}",
+            size=1050000,
+            block_count=1,
+            record_count=2,
+            oldest_record=1000000000,
+            latest_record=5000000000,
+        )
+        for i in range(10)
+    ]
+
+    result = runner(
+        f"-c {conf} --parallel 2 export folder test/src_bucket {export_path} "
+        f"--format tar"
+    )
+    assert result.exit_code == 0
+    assert max_opened == 2
+    for i in range(10):
+        with open_tar(export_path / f"entry-{i}.tar") as tar:
+            assert len(tar.getnames()) == 2
+
+
+@pytest.mark.usefixtures("set_alias", "client")
+def test__export_to_folder_query_error(runner, conf, src_bucket, export_path):
+    """Should write records which have been read before the query fails"""
+
+    async def query(*_args, **_kwargs):
+        for timestamp in range(5):
+            yield make_record(timestamp, [b"Hey"])
+        raise RuntimeError("Oops")
+
+    src_bucket.query.side_effect = query
+
+    result = runner(
+        f"-c {conf} export folder test/src_bucket {export_path} --entries=entry-1"
+    )
+    assert result.output.endswith("[RuntimeError] Oops\nAborted!\n")
+    assert result.exit_code == 1
+    for timestamp in range(5):
+        assert (export_path / "entry-1" / f"{timestamp}.bin").read_bytes() == b"Hey"
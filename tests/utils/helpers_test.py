@@ -1,11 +1,18 @@
 """Unit tests for helpers"""
+import asyncio
 from asyncio import Semaphore
 
 import pytest
 from reduct import EntryInfo
 from rich.progress import Progress
 
-from reduct_cli.utils.helpers import read_records_with_progress
+from reduct_cli.utils.helpers import (
+    read_records_with_progress,
+    gather_or_cancel,
+    run,
+    signal_queue,
+)
+from tests.conftest import AsyncIter
 
 
 @pytest.fixture(name="progress")
@@ -56,3 +63,108 @@ async def test__read_records_with_progress_with_integers(
     assert len(result) == 2
     assert result[0].timestamp == 1000000000
     assert result[1].timestamp == 5000000000
+
+
+@pytest.mark.asyncio
+async def test__read_records_with_progress_throttled(
+    mocker, entry, src_bucket, records, progress, default_kwargs
+):
+    """Should re-render progress not more often than PROGRESS_INTERVAL"""
+    mocker.patch("reduct_cli.utils.helpers.monotonic", return_value=0)
+    src_bucket.query.return_value = AsyncIter(records * 5)
+
+    result = [
+        record
+        async for record in read_records_with_progress(
+            entry,
+            src_bucket,
+            progress,
+            start="1000000000",
+            stop="5000000000",
+            **default_kwargs,
+        )
+    ]
+
+    assert len(result) == 10
+    # first record, last record and completion
+    assert progress.update.call_count == 3
+    assert (
+        progress.update.call_args_list[1]
+        .kwargs["description"]
+        .startswith("Entry 'entry-1' (copied 9 records (30 B)")
+    )
+
+
+@pytest.mark.asyncio
+async def test__read_records_with_progress_stopped(
+    mocker, entry, src_bucket, records, progress, default_kwargs
+):
+    """Should show throttled progress before stopping"""
+    mocker.patch("reduct_cli.utils.helpers.monotonic", return_value=0)
+    src_bucket.query.return_value = AsyncIter(records * 5)
+
+    result = []
+    try:
+        async for record in read_records_with_progress(
+            entry,
+            src_bucket,
+            progress,
+            start="1000000000",
+            stop="5000000000",
+            **default_kwargs,
+        ):
+            result.append(record)
+            if len(result) == 4:
+                signal_queue.put_nowait("stop")
+    finally:
+        while not signal_queue.empty():
+            signal_queue.get_nowait()
+
+    assert len(result) == 4
+    # first record, last read record and stop
+    assert progress.update.call_count == 3
+    assert (
+        progress.update.call_args_list[1]
+        .kwargs["description"]
+        .startswith("Entry 'entry-1' (copied 3 records (12 B)")
+    )
+    assert progress.update.call_args_list[2].kwargs["description"].endswith("stopped")
+
+
+@pytest.mark.asyncio
+async def test__gather_or_cancel():
+    """Should cancel other tasks if one of them fails"""
+    cancelled = asyncio.Event()
+
+    async def _wait():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def _fail():
+        raise RuntimeError("Oops")
+
+    with pytest.raises(RuntimeError, match="Oops"):
+        await gather_or_cancel(_wait(), _fail())
+
+    assert cancelled.is_set()
+
+
+@pytest.mark.parametrize("with_uvloop", [True, False])
+def test__run(mocker, with_uvloop):
+    """Should run coroutine with uvloop if it is installed and asyncio otherwise"""
+    uvloop = mocker.Mock() if with_uvloop else None
+    # None in sys.modules makes the import fail
+    mocker.patch.dict("sys.modules", {"uvloop": uvloop})
+    asyncio_run = mocker.patch("reduct_cli.utils.helpers.asyncio.run")
+
+    coro = mocker.Mock()
+    run(coro)
+
+    if with_uvloop:
+        uvloop.run.assert_called_once_with(coro)
+        asyncio_run.assert_not_called()
+    else:
+        asyncio_run.assert_called_once_with(coro)